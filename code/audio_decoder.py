@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import miniaudio
+import numpy as np
+from pydub import AudioSegment
+
+def decode_mp3(data):
+    """
+    Decode MP3 bytes in-process into 16-bit PCM at the native sample rate and channel count.
+    Returns a tuple of (pcm, sample_rate) where pcm has shape (frames, channels).
+    """
+    decoded = miniaudio.mp3_read_s16(data)
+    pcm = np.frombuffer(decoded.samples, dtype=np.int16).reshape(-1, decoded.nchannels)
+    return pcm, decoded.sample_rate
+
+def pcm_to_segment(pcm, sample_rate):
+    """Wrap 16-bit PCM of shape (frames, channels) into an AudioSegment without re-encoding."""
+    pcm = np.ascontiguousarray(pcm, dtype=np.int16)
+    return AudioSegment(
+        data=pcm.tobytes(),
+        sample_width=2,
+        frame_rate=sample_rate,
+        channels=pcm.shape[1]
+    )
+
+def segment_to_pcm(segment):
+    """Return the samples of an AudioSegment as 16-bit PCM of shape (frames, channels)."""
+    segment = segment.set_sample_width(2)
+    pcm = np.frombuffer(segment.raw_data, dtype=np.int16)
+    return pcm.reshape(-1, segment.channels), segment.frame_rate
+
+def decode_to_segment(data, transform=None):
+    """
+    Decode MP3 bytes straight into an AudioSegment.
+    transform is an optional callable (pcm, sample_rate) -> pcm applied before wrapping.
+    """
+    pcm, sample_rate = decode_mp3(data)
+    if transform is not None:
+        pcm = transform(pcm, sample_rate)
+    return pcm_to_segment(pcm, sample_rate)
+
+class DecoderPool:
+    """
+    Small pool of long-lived decoder workers.
+    Provider responses are submitted as soon as they arrive, so decoding runs
+    in parallel with the synthesis of the following lines.
+    """
+
+    def __init__(self, workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='decoder')
+
+    def submit(self, data):
+        """Queue MP3 bytes for decoding. Returns a Future resolving to (pcm, sample_rate)."""
+        return self._executor.submit(decode_mp3, data)
+
+    def submit_segment(self, data, transform=None):
+        """Queue MP3 bytes for decoding. Returns a Future resolving to an AudioSegment."""
+        return self._executor.submit(decode_to_segment, data, transform)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_decoder_pool():
+    """Return the process-wide decoder pool, creating it on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = DecoderPool()
+        return _default_pool
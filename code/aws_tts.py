@@ -1,9 +1,10 @@
 import re
 import os
 import boto3
+from botocore.config import Config
 from dotenv import load_dotenv
 from pydub import AudioSegment
-import io
+from audio_decoder import decode_to_segment
 
 def parse_dialogue(text):
     """Parse dialogue with emotion tags"""
@@ -56,8 +57,21 @@ def get_ssml_with_emotion(text, emotion=None):
     
     return ssml
 
-def synthesize_speech(polly_client, text, voice_id, emotion=None):
-    """Synthesize speech using Amazon Polly and return AudioSegment"""
+def read_audio_stream(stream, cancelled=None, chunk_size=16384):
+    """Read a Polly AudioStream, stopping early (returns None) once cancelled() is True"""
+    chunks = []
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        if cancelled is not None and cancelled():
+            stream.close()
+            return None
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+def synthesize_speech_mp3(polly_client, text, voice_id, emotion=None, cancelled=None, on_response=None):
+    """
+    Synthesize speech using Amazon Polly and return the MP3 bytes (None on failure).
+    on_response is called with the AudioStream so a hedged call can close it.
+    """
     try:
         ssml = get_ssml_with_emotion(text, emotion)
         print(f"Using SSML: {ssml}")
@@ -71,11 +85,14 @@ def synthesize_speech(polly_client, text, voice_id, emotion=None):
             LanguageCode='de-DE'
         )
         
-        # Convert the audio stream to AudioSegment
-        audio_stream = io.BytesIO(response['AudioStream'].read())
-        return AudioSegment.from_mp3(audio_stream)
+        if on_response is not None:
+            on_response(response['AudioStream'])
+        return read_audio_stream(response['AudioStream'], cancelled)
         
     except Exception as e:
+        if cancelled is not None and cancelled():
+            # The stream was closed because a hedged request won, do not retry
+            return None
         print(f"Error synthesizing speech: {str(e)}")
         print("Retrying without SSML...")
         try:
@@ -87,11 +104,30 @@ def synthesize_speech(polly_client, text, voice_id, emotion=None):
                 Engine='neural',
                 LanguageCode='de-DE'
             )
-            audio_stream = io.BytesIO(response['AudioStream'].read())
-            return AudioSegment.from_mp3(audio_stream)
+            if on_response is not None:
+                on_response(response['AudioStream'])
+            return read_audio_stream(response['AudioStream'], cancelled)
         except Exception as e:
             print(f"Error with plain text synthesis: {str(e)}")
-            return AudioSegment.silent(duration=500)
+            return None
+
+def synthesize_speech(polly_client, text, voice_id, emotion=None):
+    """Synthesize speech using Amazon Polly and return AudioSegment"""
+    audio = synthesize_speech_mp3(polly_client, text, voice_id, emotion)
+    if audio is None:
+        return AudioSegment.silent(duration=500)
+    
+    # Convert the audio stream to AudioSegment
+    return decode_to_segment(audio)
+
+def create_polly_client(region_name='us-west-2', timeout=None):
+    """Create a Polly client from the credentials in the environment, timeout in seconds applies per request"""
+    config = Config(connect_timeout=timeout, read_timeout=timeout) if timeout is not None else None
+    return boto3.Session(
+        aws_access_key_id=os.getenv("aws_access_key_id"),
+        aws_secret_access_key=os.getenv("aws_secret_access_key"),
+        region_name=region_name
+    ).client('polly', config=config)
 
 def main():
     load_dotenv()
@@ -114,11 +150,7 @@ def main():
     dialogue_parts = parse_dialogue(dialogue)
 
     # Initialize Polly client
-    polly_client = boto3.Session(
-        aws_access_key_id=os.getenv("aws_access_key_id"),
-        aws_secret_access_key=os.getenv("aws_secret_access_key"),
-        region_name='us-west-2'
-    ).client('polly')
+    polly_client = create_polly_client()
 
     # Initialize combined audio
     combined_audio = AudioSegment.empty()
@@ -2,8 +2,7 @@ from dotenv import load_dotenv
 import os
 from elevenlabs.client import ElevenLabs
 from elevenlabs import play
-from pydub import AudioSegment
-import io
+from audio_decoder import decode_to_segment
 from deep_translator import GoogleTranslator
 
 def translate_to_english(text):
@@ -25,7 +24,7 @@ def generate_sound_effect(client, text):
     audio_data = b''.join(result)
 
     # convert bytes object into AudioSegment
-    audio_segment = AudioSegment.from_mp3(io.BytesIO(audio_data))
+    audio_segment = decode_to_segment(audio_data)
 
     return audio_segment
 
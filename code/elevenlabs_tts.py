@@ -1,14 +1,17 @@
+import argparse
 import re
 import os
 from dotenv import load_dotenv
 from elevenlabs.client import ElevenLabs
 from elevenlabs import play, VoiceSettings
 from pydub import AudioSegment
-import io
 from deep_translator import GoogleTranslator
 import sys
-from contextlib import redirect_stdout
-from file_parser import file_parser
+from contextlib import nullcontext
+from functools import partial
+from file_parser import read_docx, format_content
+from audio_decoder import decode_to_segment, get_decoder_pool
+from emotion_dsp import apply_effects
 import json
 
 def parse_screenplay(text):
@@ -110,94 +113,155 @@ def get_voice_id(speaker, voice_ids):
     """Get the voice ID for a given speaker."""
     return voice_ids.get(speaker.lower(), None)
 
-def get_voice_settings(emotion):
-    """
-    Get VoiceSettings object based on emotion.
-    Returns VoiceSettings object with appropriate parameters.
-    
-    Parameters tuned for German emotions:
-    - stability: Controls voice consistency (0.0-1.0)
-        Lower values = more variation/expressiveness
-        Higher values = more stable/consistent
-    - similarity_boost: Controls voice authenticity (0.0-1.0)
-        Lower values = more room for expression
-        Higher values = closer to original voice
-    """
-    emotion_params = {
-        # Besorgt (worried) - moderate variation with high authenticity
-        'besorgt': VoiceSettings(
+# Per-emotion provider settings and the local DSP effects applied to the
+# synthesized segment (see emotion_dsp.EFFECTS for the available effects)
+EMOTION_PARAMS = {
+    # Besorgt (worried) - moderate variation with high authenticity
+    'besorgt': {
+        'voice_settings': VoiceSettings(
             stability=0.35,           # Some variation to express concern
             similarity_boost=0.75,    # High authenticity for believable worry
             style=0.0, 
             use_speaker_boost=True
         ),
-        
-        # Flüsternd (whispering) - high variation with moderate authenticity
-        'flüsternd': VoiceSettings(
+        # Slightly slower and breathier delivery
+        'effects': [('tempo', {'rate': 0.95}), ('breathiness', {'amount': 0.15})]
+    },
+    
+    # Flüsternd (whispering) - high variation with moderate authenticity
+    'flüsternd': {
+        'voice_settings': VoiceSettings(
             stability=0.15,           # High variation for whisper effect
             similarity_boost=0.55,    # Lower authenticity to allow for whisper
             style=0.0, 
             use_speaker_boost=True
         ),
-        
-        # Aufgeregt (excited) - very high variation with moderate authenticity
-        'aufgeregt': VoiceSettings(
+        # Local whisper instead of a second Polly request (whispering.py)
+        'effects': [('whisper', {})]
+    },
+    
+    # Aufgeregt (excited) - very high variation with moderate authenticity
+    'aufgeregt': {
+        'voice_settings': VoiceSettings(
             stability=0.10,           # Very high variation for excitement
             similarity_boost=0.60,    # Moderate authenticity for natural excitement
             style=0.0, 
             use_speaker_boost=True
         ),
-        
-        # Ängstlich (anxious) - moderate-high variation with high authenticity
-        'ängstlich': VoiceSettings(
+        # Faster and a little higher
+        'effects': [('tempo', {'rate': 1.08}), ('pitch', {'semitones': 1.0})]
+    },
+    
+    # Ängstlich (anxious) - moderate-high variation with high authenticity
+    'ängstlich': {
+        'voice_settings': VoiceSettings(
             stability=0.25,           # Significant variation for anxiety
             similarity_boost=0.80,    # High authenticity for believable anxiety
             style=0.0, 
             use_speaker_boost=True
         ),
-        
-        # Default values when no emotion is specified
-        None: VoiceSettings(
+        # Breathy, slightly raised voice
+        'effects': [('breathiness', {'amount': 0.25}), ('pitch', {'semitones': 0.5})]
+    },
+    
+    # Default values when no emotion is specified
+    None: {
+        'voice_settings': VoiceSettings(
             stability=0.50,
             similarity_boost=0.50,
             style=0.0,
             use_speaker_boost=True
-        )
+        ),
+        'effects': []
     }
+}
+
+def get_voice_settings(emotion):
+    """
+    Get VoiceSettings object based on emotion.
+    Returns VoiceSettings object with appropriate parameters.
     
-    return emotion_params.get(emotion, emotion_params[None])
+    Parameters tuned for German emotions:
+    - stability: Controls voice consistency (0.0-1.0)
+        Lower values = more variation/expressiveness
+        Higher values = more stable/consistent
+    - similarity_boost: Controls voice authenticity (0.0-1.0)
+        Lower values = more room for expression
+        Higher values = closer to original voice
+    """
+    return EMOTION_PARAMS.get(emotion, EMOTION_PARAMS[None])['voice_settings']
 
-def process_dialogue(client, voice_id, speaker, emotion, text):
-    # Process each line and collect audio segments
+def get_emotion_effects(emotion):
+    """Get the local DSP effect chain for an emotion as a list of (effect, parameters)."""
+    return EMOTION_PARAMS.get(emotion, EMOTION_PARAMS[None])['effects']
+
+def emotion_transform(emotion):
+    """Returns a PCM transform applying the emotion effects, or None when there are none."""
+    effects = get_emotion_effects(emotion)
+    if not effects:
+        return None
+    return lambda pcm, sample_rate: apply_effects(pcm, sample_rate, effects)
+
+# Model and output format per render tier: draft is a fast, cheap read-through,
+# final is the full quality render
+RENDER_TIERS = {
+    'draft': {'model_id': "eleven_flash_v2_5", 'output_format': "mp3_22050_32"},
+    'final': {'model_id': "eleven_multilingual_v2", 'output_format': "mp3_44100_128"},
+}
+
+def synthesize_dialogue(client, voice_id, speaker, emotion, text, tier='final', cancelled=None, timeout=None,
+                        on_response=None):
+    """
+    Synthesize a line and return the raw MP3 bytes (None if it could not be converted).
+    cancelled is checked between streamed chunks so a hedged duplicate can be abandoned,
+    timeout (seconds) also ends a request that stalls before the first chunk.
+    on_response is called with the open stream so a hedged call can close it.
+    """
     print(f"Converting ({speaker}{' - ' + emotion if emotion else ''}): {text}")    
     if voice_id:
         try:
             # Get emotion-specific voice settings
             voice_settings = get_voice_settings(emotion)
             
-            audio = b''.join(list(client.text_to_speech.convert(
+            stream = client.text_to_speech.convert(
                 text=text,
                 voice_id=voice_id,
-                model_id="eleven_multilingual_v2",
-                output_format="mp3_44100_128",
-                voice_settings=voice_settings
-            )))
-            
-            # Convert audio bytes to AudioSegment
-            audio_segment = AudioSegment.from_mp3(io.BytesIO(audio))
-            
-            return audio_segment
+                model_id=RENDER_TIERS[tier]['model_id'],
+                output_format=RENDER_TIERS[tier]['output_format'],
+                voice_settings=voice_settings,
+                request_options={'timeout_in_seconds': timeout} if timeout is not None else None
+            )
+            if on_response is not None:
+                on_response(stream)
+            chunks = []
+            for chunk in stream:
+                if cancelled is not None and cancelled():
+                    # Closing the generator closes the underlying HTTP response
+                    stream.close()
+                    return None
+                chunks.append(chunk)
+            return b''.join(chunks)
             
         except Exception as e:
             print(f"Error converting text to speech for {speaker}: {e}")
     else:
         print(f"No voice ID found for speaker: {speaker}")
+
+def process_dialogue(client, voice_id, speaker, emotion, text, hedger=None):
+    # Process each line and collect audio segments
+    if hedger is not None:
+        _, audio = hedger.synthesize_dialogue(voice_id, speaker, emotion, text)
+    else:
+        audio = synthesize_dialogue(client, voice_id, speaker, emotion, text)
+    if audio is not None:
+        # Convert audio bytes to AudioSegment
+        return decode_to_segment(audio, emotion_transform(emotion))
     
 def translate_to_english(text):
     translator = GoogleTranslator(source='de', target='en')
     return translator.translate(text)
 
-def generate_sound_effect(client, text):
+def synthesize_sound_effect(client, text):
     print("Translating German description...")
     english_text = translate_to_english(text)
     
@@ -209,30 +273,21 @@ def generate_sound_effect(client, text):
     )
 
     # Combine all chunks into a single bytes object
-    audio_data = b''.join(result)
+    return b''.join(result)
+
+def generate_sound_effect(client, text):
+    audio_data = synthesize_sound_effect(client, text)
 
     # convert bytes object into AudioSegment
-    audio_segment = AudioSegment.from_mp3(io.BytesIO(audio_data))
+    audio_segment = decode_to_segment(audio_data)
 
     return audio_segment
 
-def run_parser():
-    # Create a string buffer to capture the output
-    output_buffer = io.StringIO()
-    
-    # Redirect stdout to our buffer
-    with redirect_stdout(output_buffer):
-        file_parser()
-    
-    # Get the captured output as a string
-    captured_output = output_buffer.getvalue()
-    
-    # Close the buffer
-    output_buffer.close()
-    
-    return captured_output
+def run_parser(file_path='Skript.docx'):
+    # Format the parsed table the same way file_parser() prints it
+    return format_content(read_docx(file_path))
 
-def main():
+def create_client():
     # Initialize the client
     load_dotenv()
     api_key = os.getenv("ELEVENLABS_API_KEY")
@@ -240,53 +295,145 @@ def main():
     if not api_key:
         raise ValueError("ELEVENLABS_API_KEY not found in environment variables")
     
-    client = ElevenLabs(api_key=api_key)
+    return ElevenLabs(api_key=api_key)
 
-    # Map character names to their voice IDs using default voices
-    voice_ids = {
-        'emma': "21m00Tcm4TlvDq8ikWAM",  # Rachel voice ID
-        'leo': "TxGEqnHWrfWFTfGW9XjX",    # Josh voice ID
-        'otto': "FTNCalFNG5bRnkkaP5Ug"
-    }
-    
-    parser_output = run_parser()
-
-    parsed_screenplay = parse_screenplay(parser_output)
-
-    pretty_json = json.dumps(parsed_screenplay, indent=4, ensure_ascii=False)
-    print(pretty_json)
+def synthesize_item(client, item, voice_ids, tier='final', hedger=None, limiter=None):
+    """
+    Synthesize a single parsed screenplay item.
+    Returns (provider, raw MP3 bytes); the bytes are None if synthesis failed.
+    Spoken lines go through hedger (a hedging.HedgedSynthesizer) when one is given,
+    which takes a limiter slot per attempt. Otherwise limiter is held around the request.
+    """
+    limit = limiter if limiter is not None else nullcontext()
+    if hedger is not None:
+        speak = partial(hedger.synthesize_dialogue, limiter=limiter)
+    else:
+        def speak(*args):
+            with limit:
+                return 'elevenlabs', synthesize_dialogue(client, *args)
 
     # In the highest level, script is divided into two categories: description, dialogue
     # Description has 3 tags: Environment, Background and Additional Description.
     # Dialogue has 2 characters: Emma and Leo.
+    if item['type'] == 'description':
+        # Narrator
+        if item['tag'] in {"Environment Description", "Additional Description"}:
+            voice_id = voice_ids['leo']
+            speaker = 'leo'
+            emotion = None
+            text = item["content"]
+            
+            return speak(voice_id, speaker, emotion, text, tier)
+        elif item['tag'] == "Background Description":
+            description = item['content']
+            with limit:
+                return 'elevenlabs', synthesize_sound_effect(client, description)
+        else:
+            raise ValueError("There is something wrong with the description item!")
+    elif item['type'] == 'dialogue':
+        _, speaker, emotion, text = item.values()
+        voice_id = get_voice_id(speaker, voice_ids)
+        return speak(voice_id, speaker, emotion, text, tier)
+    else:
+        raise ValueError("There is something wrong with the dialogue item!")
+
+class RenderCancelled(Exception):
+    """Raised when a render is cancelled between two screenplay items."""
+
+def render_segments(client, parsed_screenplay, voice_ids, decoder=None, limiter=None,
+                    cache=None, progress=None, cancelled=None, tier='final', hedger=None):
+    """
+    Render every screenplay item into an AudioSegment.
+    Returns a list aligned with parsed_screenplay (None where synthesis failed).
+    tier selects the model and output format from RENDER_TIERS.
+
+    Optional hooks used by the render service:
+    - limiter: context manager held around each ElevenLabs request
+    - cache: dict-like mapping of item keys to MP3 bytes, reused across renders
+    - progress: called with (rendered_items, total_items) after each item
+    - cancelled: returns True when the render should stop
+    - hedger: hedging.HedgedSynthesizer used for spoken lines; only lines won by
+      ElevenLabs are cached, so a fallback voice never replaces a line in later renders
+    """
+    # Responses are decoded in the background while the next line is synthesized
+    decoder = decoder or get_decoder_pool()
+    pending_segments = []
+    total = len(parsed_screenplay)
+
+    for index, item in enumerate(parsed_screenplay):
+        if cancelled is not None and cancelled():
+            for pending_segment in pending_segments:
+                if pending_segment is not None:
+                    pending_segment.cancel()
+            raise RenderCancelled(f"Render cancelled after {index} of {total} items")
+
+        key = json.dumps([item, voice_ids, tier], sort_keys=True, ensure_ascii=False)
+        audio = cache.get(key) if cache is not None else None
+        if audio is None:
+            provider, audio = synthesize_item(client, item, voice_ids, tier, hedger, limiter)
+            if audio is not None and cache is not None and provider == 'elevenlabs':
+                cache[key] = audio
+
+        if audio is None:
+            pending_segments.append(None)
+        else:
+            # Emotion effects run on the decoder workers, after decoding
+            emotion = item['emotion'] if item['type'] == 'dialogue' else None
+            pending_segments.append(decoder.submit_segment(audio, emotion_transform(emotion)))
+        if progress is not None:
+            progress(index + 1, total)
+
+    return [pending_segment.result() if pending_segment is not None else None
+            for pending_segment in pending_segments]
+
+def combine_segments(segments, gap_ms=1000):
+    """Join rendered segments with a fixed silence between consecutive lines."""
     combined_audio = AudioSegment.empty()
-    silence_duration = AudioSegment.silent(duration=1000)  # ms
+    silence_duration = AudioSegment.silent(duration=gap_ms)  # ms
+
+    for segment in segments:
+        if segment is None:
+            continue
 
-    for item in parsed_screenplay:
         # Add silence between lines
         if len(combined_audio) > 0:
             combined_audio += silence_duration
-            
-        if item['type'] == 'description':
-            # Narrator
-            if item['tag'] in {"Environment Description", "Additional Description"}:
-                voice_id = voice_ids['leo']
-                speaker = 'leo'
-                emotion = None
-                text = item["content"]
-                
-                combined_audio += process_dialogue(client, voice_id, speaker, emotion, text)
-            elif item['tag'] == "Background Description":
-                description = item['content']
-                combined_audio += generate_sound_effect(client, description)
-            else:
-                raise ValueError("There is something wrong with the description item!")
-        elif item['type'] == 'dialogue':
-            _, speaker, emotion, text = item.values()
-            voice_id = get_voice_id(speaker, voice_ids)
-            combined_audio += process_dialogue(client, voice_id, speaker, emotion, text)
-        else:
-            raise ValueError("There is something wrong with the dialogue item!")
+
+        combined_audio += segment
+
+    return combined_audio
+
+# Map character names to their voice IDs using default voices
+VOICE_IDS = {
+    'emma': "21m00Tcm4TlvDq8ikWAM",  # Rachel voice ID
+    'leo': "TxGEqnHWrfWFTfGW9XjX",    # Josh voice ID
+    'otto': "FTNCalFNG5bRnkkaP5Ug"
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Render Skript.docx into combined_dialogue.mp3")
+    arg_parser.add_argument('--hedge-percentile', type=float,
+                            help="send a hedged request once a line takes longer than this latency percentile")
+    arg_parser.add_argument('--request-timeout', type=float, default=60,
+                            help="seconds before a hedged line is given up")
+    args = arg_parser.parse_args()
+
+    client = create_client()
+    hedger = None
+    if args.hedge_percentile is not None:
+        # hedging imports this module, so it is only loaded when hedging is asked for
+        from hedging import HedgedSynthesizer
+        hedger = HedgedSynthesizer.from_env(client, percentile=args.hedge_percentile, timeout=args.request_timeout)
+    
+    parser_output = run_parser()
+
+    parsed_screenplay = parse_screenplay(parser_output)
+
+    pretty_json = json.dumps(parsed_screenplay, indent=4, ensure_ascii=False)
+    print(pretty_json)
+
+    segments = render_segments(client, parsed_screenplay, VOICE_IDS, hedger=hedger)
+    combined_audio = combine_segments(segments)
 
     # Save the combined audio
     output_filename = "combined_dialogue.mp3"
@@ -0,0 +1,128 @@
+import numpy as np
+
+# STFT parameters shared by all effects
+N_FFT = 1024
+HOP = 256
+
+def _stft(signal):
+    """Hann-windowed STFT of a 1-D float signal. Returns an array of shape (frames, bins)."""
+    window = np.hanning(N_FFT)
+    padded = np.pad(signal, (N_FFT // 2, N_FFT // 2 + N_FFT))
+    frame_count = 1 + (len(padded) - N_FFT) // HOP
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP][:frame_count]
+    return np.fft.rfft(frames * window, axis=1)
+
+def _istft(spectrum, length):
+    """Weighted overlap-add inverse of _stft, trimmed to length samples."""
+    window = np.hanning(N_FFT)
+    frames = np.fft.irfft(spectrum, n=N_FFT, axis=1) * window
+    total = N_FFT + HOP * (len(frames) - 1)
+
+    # Scatter every frame into the output in one go
+    indices = (np.arange(len(frames))[:, None] * HOP + np.arange(N_FFT)).ravel()
+    output = np.bincount(indices, weights=frames.ravel(), minlength=total)
+    norm = np.bincount(indices, weights=np.tile(window ** 2, len(frames)), minlength=total)
+    output /= np.maximum(norm, 1e-8)
+    return output[N_FFT // 2:N_FFT // 2 + length]
+
+def _frequency_gain(sample_rate, points):
+    """Piecewise linear EQ curve in dB over the rfft bins, from (hz, db) points."""
+    frequencies = np.fft.rfftfreq(N_FFT, 1 / sample_rate)
+    hz, db = zip(*points)
+    return 10 ** (np.interp(frequencies, hz, db) / 20)
+
+def _rms(signal):
+    return np.sqrt(np.mean(signal ** 2)) if len(signal) else 0.0
+
+def _noise_excitation(signal, sample_rate, eq=1.0, seed=0):
+    """
+    Replaces the voiced excitation with noise shaped by the spectral envelope:
+    the magnitude is smoothed across frequency to remove the harmonics and
+    the phase is randomised, which leaves an unvoiced signal with the same
+    formants and loudness contour. eq is an optional gain per rfft bin.
+    """
+    spectrum = _stft(signal)
+    magnitude = np.abs(spectrum)
+
+    # Envelope over roughly 300 Hz removes pitch harmonics but keeps formants
+    width = max(3, int(300 / (sample_rate / N_FFT)) | 1)
+    half = width // 2
+    summed = np.cumsum(np.pad(magnitude, ((0, 0), (half + 1, half)), mode='edge'), axis=1)
+    envelope = (summed[:, width:] - summed[:, :-width]) / width
+
+    rng = np.random.default_rng(seed)
+    phase = np.exp(2j * np.pi * rng.random(spectrum.shape))
+    return _istft(envelope * eq * phase, len(signal))
+
+def whisper(signal, sample_rate, highpass_hz=400, level=0.7):
+    """De-voiced whisper: noise excitation, low cut and a presence lift."""
+    eq = _frequency_gain(sample_rate, [
+        (0, -30), (highpass_hz, -6), (highpass_hz * 2, 0), (2500, 4), (6000, 4), (sample_rate / 2, -2)
+    ])
+    whispered = _noise_excitation(signal, sample_rate, eq)
+    return whispered * (level * _rms(signal) / max(_rms(whispered), 1e-8))
+
+def breathiness(signal, sample_rate, amount=0.2):
+    """Mixes a breath noise layer that follows the voice envelope into the dry signal."""
+    eq = _frequency_gain(sample_rate, [(0, -24), (800, -6), (1500, 0), (sample_rate / 2, 0)])
+    breath = _noise_excitation(signal, sample_rate, eq, seed=1)
+    breath *= _rms(signal) / max(_rms(breath), 1e-8)
+    return (1 - amount) * signal + amount * breath
+
+def change_tempo(signal, sample_rate, rate):
+    """Phase vocoder time stretch; rate > 1 speaks faster, pitch is unchanged."""
+    if rate == 1 or not len(signal):
+        return signal
+    spectrum = _stft(signal)
+    steps = np.arange(0, len(spectrum) - 1, rate)
+    base = steps.astype(int)
+    fraction = (steps - base)[:, None]
+
+    magnitude = (1 - fraction) * np.abs(spectrum[base]) + fraction * np.abs(spectrum[base + 1])
+
+    # Accumulate the measured phase advance of each bin instead of copying phases
+    expected = 2 * np.pi * HOP * np.arange(spectrum.shape[1]) / N_FFT
+    advance = np.angle(spectrum[base + 1]) - np.angle(spectrum[base]) - expected
+    advance -= 2 * np.pi * np.round(advance / (2 * np.pi))
+    increments = np.vstack([np.zeros_like(expected), (expected + advance)[:-1]])
+    phase = np.angle(spectrum[0]) + np.cumsum(increments, axis=0)
+
+    return _istft(magnitude * np.exp(1j * phase), int(round(len(signal) / rate)))
+
+def shift_pitch(signal, sample_rate, semitones):
+    """Pitch shift that keeps the duration: time stretch, then resample back to the original length."""
+    if semitones == 0 or not len(signal):
+        return signal
+    factor = 2 ** (semitones / 12)
+    stretched = change_tempo(signal, sample_rate, 1 / factor)
+    positions = np.arange(len(signal)) * (len(stretched) / len(signal))
+    return np.interp(positions, np.arange(len(stretched)), stretched)
+
+EFFECTS = {
+    'whisper': whisper,
+    'breathiness': breathiness,
+    'tempo': change_tempo,
+    'pitch': shift_pitch,
+}
+
+def apply_effects(pcm, sample_rate, effects):
+    """
+    Runs a chain of (effect name, parameters) on 16-bit PCM of shape (frames, channels).
+    Returns 16-bit PCM; the frame count changes only with tempo effects.
+    """
+    if not effects:
+        return pcm
+
+    channels = []
+    for channel in pcm.T:
+        signal = channel.astype(np.float64) / 32768
+        for name, params in effects:
+            signal = EFFECTS[name](signal, sample_rate, **params)
+        channels.append(signal)
+
+    output = np.stack(channels, axis=1)
+    # Guard against clipping introduced by the EQ or the noise layer
+    peak = np.max(np.abs(output)) if output.size else 0
+    if peak > 1:
+        output /= peak
+    return np.round(output * 32767).astype(np.int16)
@@ -159,6 +159,7 @@ def parse_character_content(text):
     return parsed_lines
 
 def read_docx(file_path):
+    # file_path may also be a file-like object, e.g. an uploaded script
     doc = Document(file_path)
     parsed_content = []
     
@@ -190,27 +191,35 @@ def read_docx(file_path):
     
     return parsed_content
 
-def file_parser():
-    file_path = 'Skript.docx'
-    content = read_docx(file_path)
+def format_content(content):
+    """
+    Formats parsed content into the tagged text consumed by the screenplay parser.
+    """
+    lines = []
     
     for item in content:
         if item['type'] == 'environment':
-            print("\n[Environment Description]:")
-            print(item['content'])
+            lines.append("\n[Environment Description]:")
+            lines.append(item['content'])
         
         elif item['type'] == 'background':
-            print("\n[Background Description]:")
+            lines.append("\n[Background Description]:")
             for line in item['content']:
-                print(f"{line}")
+                lines.append(f"{line}")
         
         elif item['type'] == 'description':
-            print(f"\n[Additional Description]:\n{item['content']}")
+            lines.append(f"\n[Additional Description]:\n{item['content']}")
         
         elif item['type'] == 'dialogue':
             emotion_str = f" ({item['emotion']})" if item['emotion'] else ""
-            print(f"\n[{item['character']}{emotion_str}]:")
-            print(f"{item['content']}")
+            lines.append(f"\n[{item['character']}{emotion_str}]:")
+            lines.append(f"{item['content']}")
+    
+    return ''.join(line + '\n' for line in lines)
+
+def file_parser(file_path='Skript.docx'):
+    content = read_docx(file_path)
+    print(format_content(content), end='')
 
 if __name__ == "__main__":
     file_parser()
\ No newline at end of file
@@ -0,0 +1,284 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from elevenlabs_tts import synthesize_dialogue
+
+# Fallback providers are optional, hedges stay on ElevenLabs without them
+try:
+    from aws_tts import synthesize_speech_mp3, create_polly_client
+except ImportError:
+    synthesize_speech_mp3 = create_polly_client = None
+
+try:
+    from openai_tts import synthesize_line, create_client as create_openai_client
+except ImportError:
+    synthesize_line = create_openai_client = None
+
+# Fallback voice per speaker for each provider
+FALLBACK_VOICES = {
+    'polly': {
+        'emma': 'Vicki',   # German female voice
+        'leo': 'Daniel',   # German male voice
+        'otto': 'Daniel'
+    },
+    'openai': {
+        'emma': 'nova',
+        'leo': 'onyx',
+        'otto': 'echo'
+    }
+}
+
+class LatencyTracker:
+    """
+    Rolling window of request latencies per provider and text length bucket,
+    so a long line is compared against other long lines and not against the
+    short ones that dominate a script.
+    """
+
+    def __init__(self, window=200):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def length_bucket(text):
+        # Buckets double in size: under 32 characters, 32-63, 64-127, ...
+        return max(0, len(text).bit_length() - 5)
+
+    def record(self, provider, text, seconds):
+        with self._lock:
+            self._samples[provider, self.length_bucket(text)].append(seconds)
+
+    def percentile(self, provider, text, percentile, min_samples=10):
+        """
+        Nearest-rank latency percentile in seconds for lines as long as text,
+        or None until min_samples have been recorded for that length.
+        """
+        with self._lock:
+            samples = sorted(self._samples[provider, self.length_bucket(text)])
+        if len(samples) < min_samples:
+            return None
+        rank = max(1, math.ceil(percentile / 100 * len(samples)))
+        return samples[rank - 1]
+
+# How often a hedged call checks whether its primary request got a limiter slot
+SLOT_POLL_INTERVAL = 0.05
+
+class _Attempt:
+    """One provider request of a hedged call that can be cancelled from another thread."""
+
+    def __init__(self, provider, function, limiter):
+        self.provider = provider
+        self.function = function
+        self.limiter = limiter
+        self.cancelled = threading.Event()
+        # Set once the request holds its limiter slot, latency is measured from here
+        self.started = None
+        self._responses = []
+        self._lock = threading.Lock()
+        self._holds_slot = False
+
+    def run(self, tracker, text):
+        if self.limiter is not None:
+            self.limiter.__enter__()
+            with self._lock:
+                self._holds_slot = True
+        try:
+            # The line may have been won while this attempt waited for a slot
+            if self.cancelled.is_set():
+                return None
+            self.started = time.monotonic()
+            result = self.function(self.cancelled.is_set, self._responses.append)
+            if result is not None and not self.cancelled.is_set():
+                tracker.record(self.provider, text, time.monotonic() - self.started)
+            return result
+        finally:
+            self.release_slot()
+
+    def release_slot(self):
+        with self._lock:
+            if not self._holds_slot:
+                return
+            self._holds_slot = False
+        self.limiter.__exit__(None, None, None)
+
+    def cancel(self):
+        self.cancelled.set()
+        # A request stalled before its first byte only returns at its timeout,
+        # hand its slot to the next request now instead
+        self.release_slot()
+        for response in list(self._responses):
+            try:
+                response.close()
+            except Exception:
+                # A generator that is being read from cannot be closed, the
+                # worker sees the cancel flag at the next chunk instead
+                pass
+
+def hedged_call(attempts, tracker, text, executors, limiters=None, percentile=95, min_samples=10,
+                default_delay=8.0, timeout=None):
+    """
+    Runs attempts, a list of (provider, function), where
+    function(cancelled, on_response) returns a result or None when it failed.
+    on_response registers the open HTTP response (anything with close()) so a
+    losing request can be aborted. Each attempt runs on the executor of its
+    provider and holds a slot of its provider's limiter. The next attempt is
+    only started once the first one has held its slot for longer than the
+    tracked latency percentile of its provider for a text of this length (or
+    failed); time spent queued for a slot never triggers a hedge.
+    The first usable result wins, the others are cancelled.
+    Returns (provider, result), or (None, None) when every attempt failed or
+    nothing succeeded within timeout seconds.
+    """
+    limiters = limiters or {}
+    remaining = list(attempts)
+    running = {}
+    hedge_delay = tracker.percentile(attempts[0][0], text, percentile, min_samples) or default_delay
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    def launch():
+        provider, function = remaining.pop(0)
+        attempt = _Attempt(provider, function, limiters.get(provider))
+        running[executors[provider].submit(attempt.run, tracker, text)] = attempt
+        return attempt
+
+    primary = launch()
+    next_hedge = None
+    try:
+        while running:
+            if next_hedge is None and primary.started is not None:
+                next_hedge = primary.started + hedge_delay
+            waits = []
+            if remaining:
+                # Hedges would only add load while the primary waits for a slot
+                waits.append(SLOT_POLL_INTERVAL if next_hedge is None else max(0.0, next_hedge - time.monotonic()))
+            if deadline is not None:
+                waits.append(max(0.0, deadline - time.monotonic()))
+            done, _ = wait(running, timeout=min(waits) if waits else None, return_when=FIRST_COMPLETED)
+            if not done:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    print(f"No provider answered within {timeout:g}s, giving up on this line")
+                    return None, None
+                if next_hedge is not None and now >= next_hedge:
+                    print(f"Request to {primary.provider} passed p{percentile} ({hedge_delay:.2f}s), "
+                          "sending hedged request")
+                    launch()
+                    next_hedge = now + hedge_delay
+                continue
+
+            for future in done:
+                attempt = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error from {attempt.provider}: {e}")
+                    result = None
+                if result is not None:
+                    return attempt.provider, result
+
+            # Everything in flight failed, try the next attempt right away
+            if not running and remaining:
+                launch()
+        return None, None
+    finally:
+        now = time.monotonic()
+        for future, attempt in running.items():
+            attempt.cancel()
+            future.cancel()
+            # The loser took at least this long, keep that in the window so the
+            # percentile does not drift towards the fast requests only
+            if attempt.started is not None:
+                tracker.record(attempt.provider, text, now - attempt.started)
+
+class HedgedSynthesizer:
+    """
+    Drop-in for synthesize_dialogue that hedges slow ElevenLabs requests with a
+    duplicate request on the mapped fallback voice (Polly, then OpenAI) or on
+    ElevenLabs itself when no fallback client is available.
+
+    limiters maps provider names to rate limiters (context managers); every
+    attempt holds a slot of its own provider's limiter, hedges included.
+    timeout bounds each line, and is passed to the provider requests as well
+    so a request stalled before its first byte does not keep its worker busy.
+    """
+
+    def __init__(self, client, polly_client=None, openai_client=None, tracker=None,
+                 percentile=95, min_samples=10, default_delay=8.0, limiters=None, timeout=60.0,
+                 max_workers=8):
+        self.client = client
+        self.polly_client = polly_client
+        self.openai_client = openai_client
+        self.tracker = tracker or LatencyTracker()
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.limiters = limiters or {}
+        self.timeout = timeout
+        # One pool per provider, so requests stuck on a fallback never starve the primary
+        self.executors = {
+            provider: ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'hedge-{provider}')
+            for provider in ('elevenlabs', 'polly', 'openai')
+        }
+
+    @classmethod
+    def from_env(cls, client, **kwargs):
+        """Builds fallback clients for every optional provider that is installed and configured."""
+        polly_client = openai_client = None
+        if create_polly_client is not None:
+            try:
+                polly_client = create_polly_client(timeout=kwargs.get('timeout', 60.0))
+            except Exception as e:
+                print(f"Polly fallback disabled: {e}")
+        if create_openai_client is not None:
+            try:
+                openai_client = create_openai_client()
+            except Exception as e:
+                print(f"OpenAI fallback disabled: {e}")
+        return cls(client, polly_client, openai_client, **kwargs)
+
+    def _attempts(self, voice_id, speaker, emotion, text, tier):
+        attempts = [('elevenlabs', lambda cancelled, on_response: synthesize_dialogue(
+            self.client, voice_id, speaker, emotion, text, tier, cancelled, self.timeout, on_response
+        ))]
+        speaker_key = speaker.lower()
+
+        if self.polly_client is not None and speaker_key in FALLBACK_VOICES['polly']:
+            polly_voice = FALLBACK_VOICES['polly'][speaker_key]
+            attempts.append(('polly', lambda cancelled, on_response: synthesize_speech_mp3(
+                self.polly_client, text, polly_voice, emotion, cancelled, on_response
+            )))
+        if self.openai_client is not None and speaker_key in FALLBACK_VOICES['openai']:
+            openai_voice = FALLBACK_VOICES['openai'][speaker_key]
+            attempts.append(('openai', lambda cancelled, on_response: synthesize_line(
+                self.openai_client, text, openai_voice, self.timeout, cancelled, on_response
+            )))
+
+        if len(attempts) == 1:
+            # No fallback provider, hedge with a duplicate request
+            attempts.append(attempts[0])
+        return attempts
+
+    def synthesize_dialogue(self, voice_id, speaker, emotion, text, tier='final', limiter=None):
+        """
+        Returns (provider, MP3 bytes) from the winning attempt, or (None, None).
+        limiter overrides the ElevenLabs limiter for this line.
+        """
+        if not voice_id:
+            # Keeps the "No voice ID" message and return value of synthesize_dialogue
+            return 'elevenlabs', synthesize_dialogue(self.client, voice_id, speaker, emotion, text, tier)
+        limiters = dict(self.limiters)
+        if limiter is not None:
+            limiters['elevenlabs'] = limiter
+        return hedged_call(
+            self._attempts(voice_id, speaker, emotion, text, tier),
+            self.tracker,
+            text,
+            self.executors,
+            limiters,
+            self.percentile,
+            self.min_samples,
+            self.default_delay,
+            self.timeout
+        )
@@ -0,0 +1,282 @@
+import struct
+from collections import namedtuple
+from pydub import AudioSegment
+from audio_decoder import decode_to_segment
+
+# MPEG audio sample rates indexed by [version bits][sample rate bits]
+MPEG_SAMPLE_RATES = {
+    0b11: (44100, 48000, 32000),  # MPEG 1
+    0b10: (22050, 24000, 16000),  # MPEG 2
+    0b00: (11025, 12000, 8000),   # MPEG 2.5
+}
+
+# Layer III bitrates in kbps indexed by the bitrate bits, MPEG 1 and MPEG 2/2.5
+BITRATES = {
+    0b11: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    0b10: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+BITRATES[0b00] = BITRATES[0b10]
+
+LAYER_3 = 0b01
+MONO = 0b11
+# Samples the decoder emits before the first encoded sample, on top of the encoder delay
+DECODER_DELAY = 529
+
+FrameHeader = namedtuple('FrameHeader', [
+    'version', 'bitrate_index', 'bitrate', 'sample_rate_index', 'sample_rate',
+    'padding', 'channel_mode', 'protected', 'length', 'samples', 'side_info_length'
+])
+
+Mp3Stream = namedtuple('Mp3Stream', ['header', 'frames', 'encoder_delay', 'encoder_padding'])
+
+def skip_id3v2(data):
+    """Return the offset of the first byte after a leading ID3v2 tag (0 if there is none)."""
+    if len(data) >= 10 and data[:3] == b'ID3':
+        # Tag size is a 28-bit syncsafe integer, footer flag adds another 10 bytes
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+def _frame_length(version, bitrate, sample_rate, padding):
+    coefficient = 144 if version == 0b11 else 72
+    return coefficient * bitrate * 1000 // sample_rate + padding
+
+def parse_frame_header(data, offset):
+    """Parses the Layer III frame header at offset. Returns a FrameHeader, or None if it is not one."""
+    if offset + 4 > len(data) or data[offset] != 0xFF or (data[offset + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[offset + 1] >> 3) & 0b11
+    layer = (data[offset + 1] >> 1) & 0b11
+    bitrate_index = data[offset + 2] >> 4
+    sample_rate_index = (data[offset + 2] >> 2) & 0b11
+    if version not in MPEG_SAMPLE_RATES or layer != LAYER_3 or bitrate_index in (0, 15) or sample_rate_index == 0b11:
+        return None
+
+    bitrate = BITRATES[version][bitrate_index]
+    sample_rate = MPEG_SAMPLE_RATES[version][sample_rate_index]
+    padding = (data[offset + 2] >> 1) & 1
+    channel_mode = data[offset + 3] >> 6
+    mono = channel_mode == MONO
+    if version == 0b11:
+        side_info_length = 17 if mono else 32
+    else:
+        side_info_length = 9 if mono else 17
+
+    return FrameHeader(
+        version=version,
+        bitrate_index=bitrate_index,
+        bitrate=bitrate,
+        sample_rate_index=sample_rate_index,
+        sample_rate=sample_rate,
+        padding=padding,
+        channel_mode=channel_mode,
+        protected=not data[offset + 1] & 1,
+        length=_frame_length(version, bitrate, sample_rate, padding),
+        samples=1152 if version == 0b11 else 576,
+        side_info_length=side_info_length
+    )
+
+def iter_frames(data):
+    """Yields (offset, FrameHeader) for every MPEG frame, skipping ID3 tags and junk between frames."""
+    offset = skip_id3v2(data)
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+
+    while offset + 4 <= end:
+        header = parse_frame_header(data, offset)
+        if header is None or offset + header.length > end:
+            offset += 1
+            continue
+        # A real frame is followed by another frame or by the end of the stream
+        next_offset = offset + header.length
+        if next_offset + 4 <= end and parse_frame_header(data, next_offset) is None:
+            offset += 1
+            continue
+        yield offset, header
+        offset = next_offset
+
+def _xing_offset(header):
+    return 4 + (2 if header.protected else 0) + header.side_info_length
+
+def _read_encoder_delay(data, offset, header):
+    """
+    Reads the Xing/Info tag of the first frame.
+    Returns (is_info_frame, encoder_delay, encoder_padding).
+    """
+    tag_offset = offset + _xing_offset(header)
+    tag = bytes(data[tag_offset:tag_offset + 4])
+    if tag not in (b'Xing', b'Info'):
+        # VBRI (Fraunhofer) header sits at a fixed offset and carries no gapless info
+        return bytes(data[offset + 36:offset + 40]) == b'VBRI', 0, 0
+
+    flags = struct.unpack('>I', data[tag_offset + 4:tag_offset + 8])[0]
+    lame_offset = tag_offset + 8
+    lame_offset += 4 * bool(flags & 0x1) + 4 * bool(flags & 0x2) + 100 * bool(flags & 0x4) + 4 * bool(flags & 0x8)
+
+    if lame_offset + 24 > offset + header.length or bytes(data[lame_offset:lame_offset + 4]) not in (b'LAME', b'Lavf', b'Lavc'):
+        return True, 0, 0
+    delay_padding = int.from_bytes(data[lame_offset + 21:lame_offset + 24], 'big')
+    return True, delay_padding >> 12, delay_padding & 0xFFF
+
+def parse_mp3(data):
+    """
+    Splits an MP3 response into its audio frames (as memoryviews, without copying),
+    dropping ID3 tags and the Xing/Info/VBRI frame but keeping its encoder delay and padding.
+    """
+    view = memoryview(data)
+    frames = []
+    encoder_delay = encoder_padding = 0
+
+    for index, (offset, header) in enumerate(iter_frames(view)):
+        if index == 0:
+            # The Info frame may use a different bitrate than the audio frames
+            is_info_frame, encoder_delay, encoder_padding = _read_encoder_delay(view, offset, header)
+            if is_info_frame:
+                continue
+        frames.append((header, view[offset:offset + header.length]))
+
+    if not frames:
+        raise ValueError("No MPEG Layer III frames found in audio data")
+    return Mp3Stream(frames[0][0], frames, encoder_delay, encoder_padding)
+
+def _header_bytes(template, bitrate_index, protected=False):
+    return bytes([
+        0xFF,
+        0xE0 | (template.version << 3) | (LAYER_3 << 1) | (0 if protected else 1),
+        (bitrate_index << 4) | (template.sample_rate_index << 2),
+        template.channel_mode << 6
+    ])
+
+def silence_frame(template):
+    """
+    Builds a frame that decodes to digital silence: all-zero side info means
+    no main data and no spectral values in any granule.
+    """
+    length = _frame_length(template.version, template.bitrate, template.sample_rate, 0)
+    return _header_bytes(template, template.bitrate_index) + bytes(length - 4)
+
+def _crc16(data):
+    # CRC-16/ARC, as used for the LAME tag checksum
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+def info_frame(template, frame_count, stream_bytes, encoder_delay, encoder_padding):
+    """
+    Builds a CBR Info frame with a LAME tag carrying the encoder delay and
+    padding, so gapless players trim exactly the edges of the assembled file.
+    """
+    tag_offset = 4 + template.side_info_length
+    needed = tag_offset + 8 + 4 + 4 + 100 + 36
+
+    # Low bitrate frames are too small for the tag, use the smallest bitrate that fits
+    for bitrate_index in range(template.bitrate_index, 15):
+        bitrate = BITRATES[template.version][bitrate_index]
+        length = _frame_length(template.version, bitrate, template.sample_rate, 0)
+        if length >= needed:
+            break
+    else:
+        raise ValueError("Info frame does not fit into any bitrate")
+
+    frame = bytearray(length)
+    frame[:4] = _header_bytes(template, bitrate_index)
+    total_bytes = stream_bytes + length
+    toc = bytes(min(255, i * 256 // 100) for i in range(100))
+
+    tag = b'Info' + struct.pack('>III', 0x7, frame_count, total_bytes) + toc
+    lame = bytearray(36)
+    lame[:9] = b'LAME3.100'
+    lame[20] = min(255, template.bitrate)
+    lame[21:24] = ((min(encoder_delay, 0xFFF) << 12) | min(encoder_padding, 0xFFF)).to_bytes(3, 'big')
+    frame[tag_offset:tag_offset + len(tag)] = tag
+    lame_offset = tag_offset + len(tag)
+    frame[lame_offset:lame_offset + 36] = lame
+
+    # Music CRC is left empty, the tag CRC covers every byte of the frame before the CRC field
+    crc_offset = lame_offset + 34
+    struct.pack_into('>H', frame, crc_offset, _crc16(frame[:crc_offset]))
+    return bytes(frame)
+
+def _is_compatible(streams):
+    first = streams[0].header
+    for stream in streams:
+        for header, _ in stream.frames:
+            if (header.version, header.sample_rate, header.bitrate, header.channel_mode) != \
+                    (first.version, first.sample_rate, first.bitrate, first.channel_mode):
+                return False
+    return True
+
+def _assemble_frames(streams, gap_ms):
+    template = streams[0].header
+    samples_per_frame = template.samples
+    gap_samples = gap_ms * template.sample_rate // 1000
+    silence = silence_frame(template)
+
+    parts = []
+    frame_count = 0
+    trailing = 0
+
+    for index, stream in enumerate(streams):
+        frames = [frame for _, frame in stream.frames]
+        leading = stream.encoder_delay + DECODER_DELAY if stream.encoder_delay else 0
+        if index > 0:
+            # Encoder delay and padding already sound as silence, only fill the rest
+            gap_frames = max(0, round((gap_samples - trailing - leading) / samples_per_frame))
+            parts.extend([silence] * gap_frames)
+            frame_count += gap_frames
+
+        # Frames made only of encoder padding can be dropped outright
+        padding = stream.encoder_padding
+        droppable = max(0, padding - DECODER_DELAY) // samples_per_frame if padding else 0
+        droppable = min(droppable, len(frames) - 1)
+        if droppable:
+            frames = frames[:-droppable]
+            padding -= droppable * samples_per_frame
+        trailing = max(0, padding - DECODER_DELAY) if padding else 0
+        last_padding = padding
+
+        parts.extend(frames)
+        frame_count += len(frames)
+
+    stream_bytes = sum(len(part) for part in parts)
+    header = info_frame(template, frame_count, stream_bytes, streams[0].encoder_delay, last_padding)
+    return b''.join([header, *parts])
+
+def _assemble_pcm(segments, gap_ms):
+    combined_audio = AudioSegment.empty()
+    silence_duration = AudioSegment.silent(duration=gap_ms)
+    for index, data in enumerate(segments):
+        if index > 0:
+            combined_audio += silence_duration
+        combined_audio += decode_to_segment(data)
+    return combined_audio.export(format="mp3").read()
+
+def assemble_mp3(segments, gap_ms=0, output_path=None):
+    """
+    Concatenates MP3 responses in the compressed domain with gap_ms of silence between them.
+    Segments that share sample rate, bitrate and channel mode are joined frame by frame,
+    with pre-encoded silence frames for the gaps (accurate to one frame) and a single
+    gapless Info header. Anything else falls back to decoding and re-encoding.
+    Returns the MP3 bytes and writes them to output_path if given.
+    """
+    try:
+        streams = [parse_mp3(data) for data in segments]
+        compatible = bool(streams) and _is_compatible(streams)
+    except ValueError:
+        compatible = False
+
+    if compatible:
+        output = _assemble_frames(streams, gap_ms)
+    else:
+        print("Segments differ in format, falling back to PCM assembly...")
+        output = _assemble_pcm(segments, gap_ms)
+
+    if output_path is not None:
+        with open(output_path, 'wb') as f:
+            f.write(output)
+    return output
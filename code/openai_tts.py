@@ -6,6 +6,7 @@ import re
 from pydub import AudioSegment
 import wave
 import io
+from mp3_assembler import assemble_mp3
 
 # Function to split dialogue into character lines
 def parse_dialogue(text):
@@ -39,11 +40,36 @@ def parse_dialogue(text):
     
     return dialogue_parts
 
-def main():
+def create_client():
     # initialize the OpenAI API client
     load_dotenv()
     api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+    return OpenAI(api_key=api_key)
+
+def synthesize_line(client, line, voice, timeout=None, cancelled=None, on_response=None):
+    # Generate speech for the line and return the MP3 bytes (None once cancelled() is True)
+    # timeout (seconds) overrides the client default for this request only
+    options = {'timeout': timeout} if timeout is not None else {}
+    # Streaming keeps a handle to the response, so a hedged call can stop reading it
+    with client.audio.speech.with_streaming_response.create(
+        model="tts-1",
+        voice=voice,
+        input=line,
+        speed=1.0,
+        response_format="mp3",
+        **options
+    ) as response:
+        if on_response is not None:
+            on_response(response)
+        chunks = []
+        for chunk in response.iter_bytes(16384):
+            if cancelled is not None and cancelled():
+                return None
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+def main():
+    client = create_client()
 
     dialogue = """
     [Emma]:
@@ -71,22 +97,11 @@ def main():
         voice = "nova" if speaker == "Emma" else "onyx"
         
         # Generate speech for the line
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=line,
-            speed=1.0,
-            response_format="mp3"
-        )
-        
-        # Get the audio data
-        audio_data = response.content
+        audio_data = synthesize_line(client, line, voice)
         all_audio_data.append(audio_data)
 
-    # Write all audio data to a single file
-    with open("openai_output.mp3", "wb") as outfile:
-        for audio_data in all_audio_data:
-            outfile.write(audio_data)
+    # Join the responses frame by frame into a single file with a short pause between lines
+    assemble_mp3(all_audio_data, gap_ms=500, output_path="openai_output.mp3")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
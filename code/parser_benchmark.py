@@ -0,0 +1,188 @@
+import argparse
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+from docx import Document
+from file_parser import (
+    read_docx, format_content, parse_character_content,
+    clean_environment_description, is_environment_description
+)
+from elevenlabs_tts import parse_screenplay
+
+# The parsers only recognise Emma and Leo, extra characters show up as plain text lines
+CHARACTER_NAMES = ['Emma', 'Leo', 'Otto', 'Mia', 'Jonas', 'Lena', 'Paul', 'Hanna']
+EMOTIONS = ['besorgt', 'flüsternd', 'aufgeregt', 'ängstlich']
+WORDS = (
+    "der die das und ich du wir es ist nicht hier Höhle Baum Tür Licht leise "
+    "laut plötzlich vielleicht wirklich Geräusch Wald dunkel zeigen warten"
+).split()
+
+def _sentence(rng, min_words=4, max_words=14):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return ' '.join(words).capitalize() + rng.choice(['.', '!', '?', '…'])
+
+def generate_script(file_path, scenes, characters=2, lines_per_scene=40,
+                    emotion_rate=0.3, background_rate=0.5, merge_rate=0.5, seed=0):
+    """
+    Writes a synthetic script in the same table layout as Skript.docx:
+    a two column table where environment descriptions (asterisks plus bullet
+    backgrounds) open each scene and character cells hold the dialogue.
+    Environment rows are merged across both columns with probability merge_rate.
+    Returns the number of non-empty text lines written.
+    """
+    rng = random.Random(seed)
+    names = CHARACTER_NAMES[:characters]
+    doc = Document()
+    table = doc.add_table(rows=0, cols=2)
+    line_count = 0
+
+    def fill(cell, lines):
+        cell.text = lines[0]
+        for line in lines[1:]:
+            cell.add_paragraph(line)
+
+    for scene in range(scenes):
+        # Environment description with optional bullet backgrounds
+        environment = [f"**{_sentence(rng)}", _sentence(rng)]
+        if rng.random() < background_rate:
+            environment += [f"• {_sentence(rng, 3, 8)}" for _ in range(rng.randint(1, 3))]
+        environment[-1] += '**'
+
+        row = table.add_row()
+        if rng.random() < merge_rate:
+            row.cells[0].merge(row.cells[1])
+            fill(row.cells[0], environment)
+        else:
+            fill(row.cells[0], [f"Szene {scene + 1}"])
+            fill(row.cells[1], environment)
+            line_count += 1
+        line_count += len(environment)
+
+        written = len(environment)
+        while written < lines_per_scene:
+            name = rng.choice(names)
+            header = f"{name} ({rng.choice(EMOTIONS)})" if rng.random() < emotion_rate else name
+            dialogue = [header] + [_sentence(rng) for _ in range(rng.randint(1, 3))]
+            if rng.random() < 0.1:
+                dialogue.append(f"- {_sentence(rng)}")
+
+            row = table.add_row()
+            fill(row.cells[0], [name])
+            fill(row.cells[1], dialogue)
+            written += len(dialogue) + 1
+            line_count += len(dialogue) + 1
+
+    doc.save(file_path)
+    return line_count
+
+def _measure(function, *args):
+    """Returns (result, seconds, peak_bytes). Timing and memory come from separate runs."""
+    gc.collect()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def _count_lines(texts):
+    return sum(1 for text in texts for line in text.split('\n') if line.strip())
+
+def _cell_texts(file_path):
+    # Same cell iteration as read_docx, including repeated merged cells
+    texts = []
+    for table in Document(file_path).tables:
+        for row in table.rows:
+            for cell in row.cells:
+                cell_text = cell.text.strip()
+                if cell_text:
+                    texts.append(cell_text)
+    return texts
+
+def _parse_all_character_content(texts):
+    return [parse_character_content(text) for text in texts]
+
+def _clean_all_environment_descriptions(texts):
+    return [clean_environment_description(text) for text in texts]
+
+def benchmark_script(file_path):
+    """
+    Benchmarks every parsing stage on a single script.
+    Returns a dict of stage name to lines, seconds, lines_per_second and peak_mib.
+    """
+    texts = _cell_texts(file_path)
+    environment_texts = [
+        text for text in texts
+        if is_environment_description(text) and not any(name in text for name in ['Emma', 'Leo'])
+    ]
+    environment_set = set(environment_texts)
+    character_texts = [text for text in texts if text not in environment_set]
+    screenplay_text = format_content(read_docx(file_path))
+
+    stages = {
+        'read_docx': (texts, read_docx, file_path),
+        'parse_character_content': (character_texts, _parse_all_character_content, character_texts),
+        'clean_environment_description': (environment_texts, _clean_all_environment_descriptions, environment_texts),
+        'parse_screenplay': ([screenplay_text], parse_screenplay, screenplay_text),
+    }
+
+    results = {}
+    for stage, (stage_texts, function, argument) in stages.items():
+        _, seconds, peak = _measure(function, argument)
+        lines = _count_lines(stage_texts)
+        results[stage] = {
+            'lines': lines,
+            'seconds': round(seconds, 6),
+            'lines_per_second': round(lines / seconds) if seconds else None,
+            'peak_mib': round(peak / 2**20, 3),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Parser micro-benchmarks on synthetic scripts")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="approximate number of script lines per benchmark")
+    parser.add_argument('--characters', type=int, default=2)
+    parser.add_argument('--lines-per-scene', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--script-dir', default='benchmark_scripts',
+                        help="generated scripts are kept here and reused between runs")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    os.makedirs(args.script_dir, exist_ok=True)
+    report = {}
+
+    for size in args.sizes:
+        scenes = max(1, size // args.lines_per_scene)
+        file_path = os.path.join(
+            args.script_dir,
+            f"script_{scenes}s_{args.characters}c_{args.lines_per_scene}l_{args.seed}.docx"
+        )
+        if not os.path.exists(file_path):
+            print(f"Generating {file_path}...")
+            generate_script(file_path, scenes, args.characters, args.lines_per_scene, seed=args.seed)
+
+        results = benchmark_script(file_path)
+        report[size] = results
+
+        print(f"\n{size} lines ({scenes} scenes):")
+        print(f"{'stage':<32}{'lines':>10}{'seconds':>12}{'lines/s':>14}{'peak MiB':>12}")
+        for stage, result in results.items():
+            print(f"{stage:<32}{result['lines']:>10}{result['seconds']:>12.4f}"
+                  f"{result['lines_per_second'] or 0:>14}{result['peak_mib']:>12.3f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        print(f"\nSaved results to: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import argparse
+import io
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from elevenlabs_tts import (
+    create_client, parse_screenplay, render_segments, combine_segments,
+    RenderCancelled, VOICE_IDS
+)
+from file_parser import read_docx, format_content
+from audio_decoder import get_decoder_pool
+from hedging import HedgedSynthesizer
+
+class RateLimiter:
+    """
+    Shared limit for one provider: at most max_concurrent requests in flight
+    and at least min_interval seconds between two request starts.
+    """
+
+    def __init__(self, max_concurrent=2, min_interval=0.0):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def __enter__(self):
+        self._slots.acquire()
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_start - now
+            self._next_start = max(now, self._next_start) + self._min_interval
+        if wait > 0:
+            time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._slots.release()
+
+class SegmentCache:
+    """Thread-safe LRU cache of synthesized MP3 bytes shared by all jobs."""
+
+    def __init__(self, max_entries=2048):
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def __setitem__(self, key, audio):
+        with self._lock:
+            self._entries[key] = audio
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+class RenderJob:
+    """A single uploaded script and its render state."""
+
+    def __init__(self, script, priority):
+        self.id = uuid.uuid4().hex
+        self.script = script
+        self.priority = priority
+        self.status = 'queued'
+        self.rendered = 0
+        self.total = None
+        self.error = None
+        self.output_path = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def finish(self, status):
+        self.status = status
+        self.finished_at = time.monotonic()
+        # The upload is no longer needed once the job has finished
+        self.script = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'priority': self.priority,
+            'status': self.status,
+            'progress': {'rendered': self.rendered, 'total': self.total},
+            'error': self.error,
+        }
+
+class RenderService:
+    """
+    Keeps the provider client, decoder pool and segment cache warm and renders
+    uploaded scripts from a priority queue (lower priority value runs first).
+    """
+
+    def __init__(self, output_dir, workers=2, max_concurrent_requests=2, min_request_interval=0.0,
+                 hedge_percentile=None, job_ttl=3600, request_timeout=60.0):
+        self.client = create_client()
+        self.decoder = get_decoder_pool()
+        self.cache = SegmentCache()
+        self.limiter = RateLimiter(max_concurrent_requests, min_request_interval)
+        # One latency tracker for all jobs, so hedging learns from every render.
+        # Fallback providers get limits of their own, hedges count against them
+        self.hedger = (
+            HedgedSynthesizer.from_env(
+                self.client,
+                percentile=hedge_percentile,
+                limiters={
+                    'elevenlabs': self.limiter,
+                    'polly': RateLimiter(max_concurrent_requests, min_request_interval),
+                    'openai': RateLimiter(max_concurrent_requests, min_request_interval),
+                },
+                timeout=request_timeout
+            )
+            if hedge_percentile is not None else None
+        )
+        self.output_dir = output_dir
+        # Finished jobs and their renders are dropped job_ttl seconds after finishing
+        self.job_ttl = job_ttl
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+        self._queue = queue.PriorityQueue()
+        # Tie-breaker so equal priorities run in submission order
+        self._sequence = itertools.count()
+        os.makedirs(output_dir, exist_ok=True)
+
+        for _ in range(workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, script, priority=10):
+        job = RenderJob(script, priority)
+        with self._jobs_lock:
+            self._prune_expired()
+            self._jobs[job.id] = job
+        self._queue.put((priority, next(self._sequence), job.id))
+        return job
+
+    def get_job(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._jobs_lock:
+            self._prune_expired()
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancel_event.set()
+            if job.status == 'queued':
+                job.finish('cancelled')
+        return job
+
+    def _prune_expired(self):
+        # Called with _jobs_lock held
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is None or now - job.finished_at < self.job_ttl:
+                continue
+            del self._jobs[job_id]
+            if job.output_path is not None:
+                try:
+                    os.remove(job.output_path)
+                except FileNotFoundError:
+                    pass
+
+    def _worker(self):
+        while True:
+            _, _, job_id = self._queue.get()
+            with self._jobs_lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.cancel_event.is_set():
+                    continue
+                job.status = 'running'
+            try:
+                self._render(job)
+                job.finish('done')
+            except RenderCancelled:
+                job.finish('cancelled')
+            except Exception as e:
+                traceback.print_exc()
+                job.error = str(e)
+                job.finish('failed')
+
+    def _render(self, job):
+        parsed_screenplay = parse_screenplay(format_content(read_docx(io.BytesIO(job.script))))
+        job.total = len(parsed_screenplay)
+
+        def progress(rendered, total):
+            job.rendered = rendered
+
+        segments = render_segments(
+            self.client, parsed_screenplay, VOICE_IDS,
+            decoder=self.decoder,
+            limiter=self.limiter,
+            cache=self.cache,
+            progress=progress,
+            cancelled=job.cancel_event.is_set,
+            hedger=self.hedger
+        )
+        output_path = os.path.join(self.output_dir, f"{job.id}.mp3")
+        combine_segments(segments).export(output_path, format="mp3")
+        job.output_path = output_path
+
+def make_handler(service):
+    class RenderRequestHandler(BaseHTTPRequestHandler):
+        """
+        POST   /jobs?priority=N   upload a .docx script, returns the job
+        GET    /jobs              list all jobs
+        GET    /jobs/<id>         job status and progress
+        GET    /jobs/<id>/audio   rendered MP3 once the job is done
+        DELETE /jobs/<id>         cancel a queued or running job
+        """
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _route(self):
+            url = urlparse(self.path)
+            parts = [part for part in url.path.split('/') if part]
+            if not parts or parts[0] != 'jobs':
+                return url, None, None
+            job_id = parts[1] if len(parts) > 1 else None
+            action = parts[2] if len(parts) > 2 else None
+            return url, job_id, action
+
+        def do_POST(self):
+            url, job_id, _ = self._route()
+            if url.path.rstrip('/') != '/jobs':
+                return self._send_json(404, {'error': 'Not found'})
+            length = int(self.headers.get('Content-Length', 0))
+            if not length:
+                return self._send_json(400, {'error': 'Request body must contain a .docx script'})
+            try:
+                priority = int(parse_qs(url.query).get('priority', ['10'])[0])
+            except ValueError:
+                return self._send_json(400, {'error': 'priority must be an integer'})
+            job = service.submit(self.rfile.read(length), priority)
+            self._send_json(202, job.to_dict())
+
+        def do_GET(self):
+            url, job_id, action = self._route()
+            if url.path.rstrip('/') == '/jobs':
+                return self._send_json(200, [job.to_dict() for job in service.list_jobs()])
+            job = service.get_job(job_id)
+            if job is None:
+                return self._send_json(404, {'error': 'Unknown job'})
+            if action is None:
+                return self._send_json(200, job.to_dict())
+            if action != 'audio':
+                return self._send_json(404, {'error': 'Not found'})
+            if job.status != 'done':
+                return self._send_json(409, {'error': f"Job is {job.status}"})
+            try:
+                with open(job.output_path, 'rb') as f:
+                    body = f.read()
+            except FileNotFoundError:
+                # Expired between the status check and the read
+                return self._send_json(404, {'error': 'Unknown job'})
+            self.send_response(200)
+            self.send_header('Content-Type', 'audio/mpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_DELETE(self):
+            _, job_id, _ = self._route()
+            job = service.cancel(job_id)
+            if job is None:
+                return self._send_json(404, {'error': 'Unknown job'})
+            self._send_json(200, job.to_dict())
+
+    return RenderRequestHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Local render daemon for screenplay previews")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output-dir', default='renders')
+    parser.add_argument('--workers', type=int, default=2, help="jobs rendered at the same time")
+    parser.add_argument('--max-concurrent-requests', type=int, default=2,
+                        help="requests in flight per provider across all jobs")
+    parser.add_argument('--min-request-interval', type=float, default=0.0,
+                        help="seconds between two requests to a provider across all jobs")
+    parser.add_argument('--hedge-percentile', type=float,
+                        help="send a hedged request once a line takes longer than this latency percentile")
+    parser.add_argument('--request-timeout', type=float, default=60,
+                        help="seconds before a hedged line is given up")
+    parser.add_argument('--job-ttl', type=float, default=3600,
+                        help="seconds a finished job and its render are kept")
+    args = parser.parse_args()
+
+    service = RenderService(
+        args.output_dir,
+        workers=args.workers,
+        max_concurrent_requests=args.max_concurrent_requests,
+        min_request_interval=args.min_request_interval,
+        hedge_percentile=args.hedge_percentile,
+        job_ttl=args.job_ttl,
+        request_timeout=args.request_timeout
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Render service listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from pydub import AudioSegment
+from elevenlabs_tts import (
+    create_client, run_parser, parse_screenplay, render_segments, combine_segments,
+    get_voice_id, VOICE_IDS
+)
+
+# Queue layout on the shared filesystem:
+#   pending/<job>_<shard>.json              shards waiting for a worker
+#   claimed/<job>_<shard>.json.<worker>     shards being rendered (claimed by an atomic rename)
+#   done/<job>_<shard>.json                 finished shards, segments in done/<job>_<shard>/
+#   failed/<job>_<shard>.json               shards that ran out of attempts, with the last error
+QUEUE_DIRS = ('pending', 'claimed', 'done', 'failed')
+MAX_ATTEMPTS = 3
+
+def make_worker_id():
+    # Dots would be ambiguous in claim names, hostnames may contain them
+    return f"{socket.gethostname().replace('.', '-')}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def _shard_name(claimed_name):
+    return claimed_name.partition('.json.')[0] + '.json'
+
+def _write_json(path, data):
+    # Write under a temporary name first so readers never see a partial file
+    temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def split_into_scenes(parsed_screenplay):
+    """Splits a parsed screenplay into scene shards, each starting at an Environment Description."""
+    shards = []
+    for item in parsed_screenplay:
+        if not shards or (item['type'] == 'description' and item['tag'] == "Environment Description"):
+            shards.append([])
+        shards[-1].append(item)
+    return shards
+
+def _is_speakable(item, voice_ids):
+    # A dialogue line without a voice is skipped by every render, not a failure
+    return item['type'] != 'dialogue' or get_voice_id(item['speaker'], voice_ids) is not None
+
+def _prepare_queue(queue_dir):
+    for name in QUEUE_DIRS:
+        os.makedirs(os.path.join(queue_dir, name), exist_ok=True)
+
+def dispatch(parsed_screenplay, queue_dir):
+    """Writes one queue entry per scene shard. Returns the job id and the shard count."""
+    _prepare_queue(queue_dir)
+    job = uuid.uuid4().hex[:12]
+    shards = split_into_scenes(parsed_screenplay)
+
+    for index, items in enumerate(shards):
+        name = f"{job}_{index:04d}.json"
+        _write_json(
+            os.path.join(queue_dir, 'pending', name),
+            {'job': job, 'shard': index, 'attempts': 0, 'items': items}
+        )
+
+    print(f"Dispatched job {job} as {len(shards)} scene shards")
+    return job, len(shards)
+
+def claim_shard(queue_dir, worker_id):
+    """Claims the oldest pending shard. Returns its claimed path, or None when the queue is empty."""
+    pending_dir = os.path.join(queue_dir, 'pending')
+    for name in sorted(os.listdir(pending_dir)):
+        if name.startswith('.') or not name.endswith('.json'):
+            continue
+        # The worker id keeps claims of a shard that was handed out twice apart
+        claimed_path = os.path.join(queue_dir, 'claimed', f"{name}.{worker_id}")
+        try:
+            # rename is atomic, only one worker wins a shard
+            os.rename(os.path.join(pending_dir, name), claimed_path)
+        except FileNotFoundError:
+            continue
+        os.utime(claimed_path)
+        return claimed_path
+    return None
+
+def _heartbeat(claimed_path, stop, interval):
+    # Keeps the claim fresh so a long scene is not mistaken for a dead worker
+    while not stop.wait(interval):
+        try:
+            os.utime(claimed_path)
+        except FileNotFoundError:
+            return
+
+def render_shard(client, claimed_path, queue_dir, voice_ids, heartbeat_interval=30.0):
+    with open(claimed_path, encoding='utf-8') as f:
+        shard = json.load(f)
+    claimed_name = os.path.basename(claimed_path)
+    name = _shard_name(claimed_name)
+    print(f"Rendering shard {name} ({len(shard['items'])} items)")
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(claimed_path, stop, heartbeat_interval), daemon=True)
+    heartbeat.start()
+    try:
+        segments = render_segments(client, shard['items'], voice_ids)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    # Provider errors come back as None, publishing them would silently drop lines from the merge
+    missing = [
+        index for index, (item, segment) in enumerate(zip(shard['items'], segments))
+        if segment is None and _is_speakable(item, voice_ids)
+    ]
+    if missing:
+        raise RuntimeError(f"{len(missing)} of {len(segments)} lines could not be rendered")
+
+    # WAV keeps the shard output sample exact for the merge. Segments go into a
+    # private directory that is renamed into place, so the merge never sees a partial shard
+    done_dir = os.path.join(queue_dir, 'done')
+    temp_dir = os.path.join(done_dir, f".{claimed_name}.tmp")
+    os.makedirs(temp_dir, exist_ok=True)
+    segment_files = []
+    for index, segment in enumerate(segments):
+        if segment is None:
+            segment_files.append(None)
+            continue
+        segment_file = f"{index:04d}.wav"
+        segment.export(os.path.join(temp_dir, segment_file), format="wav")
+        segment_files.append(segment_file)
+
+    segment_dir = os.path.join(done_dir, name[:-len('.json')])
+    try:
+        os.rename(temp_dir, segment_dir)
+    except OSError:
+        # Another worker already delivered this shard after a requeue, keep its output
+        print(f"Shard {name} was already rendered by another worker")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    else:
+        shard['segments'] = segment_files
+        _write_json(os.path.join(done_dir, name), shard)
+
+    # The claim may already have been requeued if this worker stopped heartbeating
+    try:
+        os.remove(claimed_path)
+    except FileNotFoundError:
+        pass
+
+def release_claim(queue_dir, claimed_path, error, max_attempts=MAX_ATTEMPTS):
+    """
+    Gives a claimed shard back to pending, or moves it to failed once it has
+    used up max_attempts. Returns False when the claim was already released.
+    """
+    name = _shard_name(os.path.basename(claimed_path))
+    # Taking the claim away with a rename makes sure only one process releases it
+    temp_path = os.path.join(queue_dir, 'pending', f".{os.path.basename(claimed_path)}.release")
+    try:
+        os.rename(claimed_path, temp_path)
+    except FileNotFoundError:
+        return False
+    with open(temp_path, encoding='utf-8') as f:
+        shard = json.load(f)
+    os.remove(temp_path)
+
+    shard['attempts'] = shard.get('attempts', 0) + 1
+    shard['error'] = error
+    if shard['attempts'] >= max_attempts:
+        print(f"Shard {name} failed after {shard['attempts']} attempts: {error}")
+        _write_json(os.path.join(queue_dir, 'failed', name), shard)
+    else:
+        _write_json(os.path.join(queue_dir, 'pending', name), shard)
+    return True
+
+def run_worker(client, queue_dir, voice_ids, poll_interval=1.0, exit_when_empty=False,
+               heartbeat_interval=30.0, max_attempts=MAX_ATTEMPTS, worker_id=None):
+    """Renders shards from the queue until stopped (or until it is empty with exit_when_empty)."""
+    _prepare_queue(queue_dir)
+    worker_id = worker_id or make_worker_id()
+    while True:
+        claimed_path = claim_shard(queue_dir, worker_id)
+        if claimed_path is None:
+            if exit_when_empty:
+                return
+            time.sleep(poll_interval)
+            continue
+        try:
+            render_shard(client, claimed_path, queue_dir, voice_ids, heartbeat_interval)
+        except Exception as e:
+            # Give the shard back so another worker can retry it
+            print(f"Error rendering shard {os.path.basename(claimed_path)}: {e}")
+            release_claim(queue_dir, claimed_path, str(e), max_attempts)
+            time.sleep(poll_interval)
+
+def requeue_stale_claims(queue_dir, job, timeout, max_attempts=MAX_ATTEMPTS):
+    """
+    Releases shards whose claim has not been refreshed for timeout seconds,
+    i.e. whose worker died or hung. This counts as a failed attempt.
+    """
+    claimed_dir = os.path.join(queue_dir, 'claimed')
+    for name in os.listdir(claimed_dir):
+        if not name.startswith(f"{job}_"):
+            continue
+        claimed_path = os.path.join(claimed_dir, name)
+        try:
+            stale = time.time() - os.path.getmtime(claimed_path) > timeout
+        except FileNotFoundError:
+            continue
+        if stale and release_claim(queue_dir, claimed_path, f"claim not refreshed for {timeout:g}s", max_attempts):
+            print(f"Requeued stale shard {name}")
+
+def _remove_job_shards(queue_dir, names):
+    """Deletes the rendered and still pending shards of a job from the queue."""
+    for name in names:
+        for path in (os.path.join(queue_dir, 'done', f"{name}.json"), os.path.join(queue_dir, 'pending', f"{name}.json")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        shutil.rmtree(os.path.join(queue_dir, 'done', name), ignore_errors=True)
+
+def merge_shards(queue_dir, job, shard_count, gap_ms=1000, poll_interval=1.0, claim_timeout=None,
+                 max_attempts=MAX_ATTEMPTS):
+    """
+    Waits for every shard of a job and merges them into one timeline.
+    Segments are joined in script order with the same gap rule as a single
+    process render, so shard boundaries do not change the timing.
+    The job's shards are removed from the queue once merged.
+    Raises RuntimeError when a shard has run out of attempts.
+    """
+    done_dir = os.path.join(queue_dir, 'done')
+    failed_dir = os.path.join(queue_dir, 'failed')
+    names = [f"{job}_{index:04d}" for index in range(shard_count)]
+
+    while not all(os.path.exists(os.path.join(done_dir, f"{name}.json")) for name in names):
+        failed = [name for name in names if os.path.exists(os.path.join(failed_dir, f"{name}.json"))]
+        if failed:
+            errors = []
+            for name in failed:
+                with open(os.path.join(failed_dir, f"{name}.json"), encoding='utf-8') as f:
+                    errors.append(f"{name}: {json.load(f).get('error')}")
+            _remove_job_shards(queue_dir, names)
+            raise RuntimeError(f"{len(failed)} shards of job {job} failed:\n" + "\n".join(errors))
+        if claim_timeout is not None:
+            requeue_stale_claims(queue_dir, job, claim_timeout, max_attempts)
+        time.sleep(poll_interval)
+
+    segments = []
+    for name in names:
+        with open(os.path.join(done_dir, f"{name}.json"), encoding='utf-8') as f:
+            shard = json.load(f)
+        for segment_file in shard['segments']:
+            segments.append(
+                AudioSegment.from_wav(os.path.join(done_dir, name, segment_file)) if segment_file else None
+            )
+
+    # Everything is in memory now, the shared queue only keeps failed markers
+    _remove_job_shards(queue_dir, names)
+    return combine_segments(segments, gap_ms)
+
+def main():
+    parser = argparse.ArgumentParser(description="Scene-level sharded rendering over a shared queue directory")
+    parser.add_argument('role', choices=['dispatch', 'worker'])
+    parser.add_argument('--queue', required=True, help="queue directory on a filesystem shared by all workers")
+    parser.add_argument('--script', default='Skript.docx')
+    parser.add_argument('--output', default='combined_dialogue.mp3')
+    parser.add_argument('--claim-timeout', type=float, default=600,
+                        help="seconds before a claimed shard is handed to another worker")
+    parser.add_argument('--heartbeat-interval', type=float, default=30,
+                        help="seconds between claim refreshes while a worker renders a shard")
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                        help="attempts per shard before the job is reported as failed")
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.role == 'worker':
+        run_worker(
+            create_client(), args.queue, VOICE_IDS, args.poll_interval,
+            heartbeat_interval=args.heartbeat_interval,
+            max_attempts=args.max_attempts
+        )
+        return
+
+    parsed_screenplay = parse_screenplay(run_parser(args.script))
+    job, shard_count = dispatch(parsed_screenplay, args.queue)
+    combined_audio = merge_shards(
+        args.queue, job, shard_count,
+        poll_interval=args.poll_interval,
+        claim_timeout=args.claim_timeout,
+        max_attempts=args.max_attempts
+    )
+    combined_audio.export(args.output, format="mp3")
+    print(f"\nSaved combined dialogue to: {args.output}")
+
+if __name__ == "__main__":
+    main()
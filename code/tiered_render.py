@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import numpy as np
+from pydub import AudioSegment
+from elevenlabs_tts import (
+    create_client, run_parser, parse_screenplay, render_segments, VOICE_IDS
+)
+from audio_decoder import segment_to_pcm, pcm_to_segment
+from emotion_dsp import apply_effects
+
+MANIFEST_NAME = "render_manifest.json"
+GAP_MS = 1000
+# Upgraded takes may eat into the gap after them down to this pause
+MIN_GAP_MS = 250
+# Strongest time compression used to fit an upgraded take into its slot
+MAX_FIT_RATE = 1.1
+
+def _is_sound_effect(item):
+    # Sound effects have a single output format, so the draft is already final
+    return item['type'] == 'description' and item['tag'] == "Background Description"
+
+def _save_segment(output_dir, index, tier, segment):
+    segment_dir = os.path.join(output_dir, "segments")
+    os.makedirs(segment_dir, exist_ok=True)
+    path = os.path.join(segment_dir, f"{index:04d}_{tier}.wav")
+    # WAV keeps the decoded PCM as is, no re-encoding between passes
+    segment.export(path, format="wav")
+    return os.path.relpath(path, output_dir)
+
+def _load_segments(manifest, output_dir):
+    return [
+        AudioSegment.from_wav(os.path.join(output_dir, entry['segment'])) if entry['segment'] else None
+        for entry in manifest['items']
+    ]
+
+def _layout_slots(manifest, segments):
+    """
+    Fixes each line's slot in the timeline from the draft render, using the same
+    ordering and gap rule as combine_segments. Later passes fill these slots, so a
+    line keeps its draft start unless an earlier take is too long to fit its slot.
+    """
+    cursor = 0
+    for entry, segment in zip(manifest['items'], segments):
+        if segment is None:
+            entry['draft_start_ms'] = None
+            entry['draft_duration_ms'] = 0
+            continue
+        entry['draft_start_ms'] = cursor
+        entry['draft_duration_ms'] = len(segment)
+        cursor += len(segment) + manifest['gap_ms']
+    manifest['duration_ms'] = max(0, cursor - manifest['gap_ms'])
+
+def _to_pcm(segment, frame_rate, channels):
+    return segment_to_pcm(segment.set_frame_rate(frame_rate).set_channels(channels))[0]
+
+def _fit_segments(manifest, pcms):
+    """
+    Places each line at its draft slot. A take longer than its slot first uses
+    the gap to the next line (keeping MIN_GAP_MS of it), and is only
+    time-compressed for what is left, by at most MAX_FIT_RATE. A take that still
+    does not fit keeps its natural length and every later line moves back.
+    Returns a list of (entry, start_ms, pcm, fit_rate).
+    """
+    frame_rate = manifest['frame_rate']
+    slotted = []
+    for entry, pcm in zip(manifest['items'], pcms):
+        if pcm is None:
+            continue
+        if entry['draft_start_ms'] is None:
+            print(f"Line {entry['index']} has no draft slot, leaving it out to keep the timeline aligned")
+            continue
+        slotted.append((entry, pcm))
+
+    placements = []
+    shift = 0
+    for position, (entry, pcm) in enumerate(slotted):
+        start_ms = entry['draft_start_ms'] + shift
+        if position + 1 < len(slotted):
+            room = (slotted[position + 1][0]['draft_start_ms'] - entry['draft_start_ms'] - MIN_GAP_MS) * frame_rate // 1000
+        else:
+            # Nothing follows the last line, the episode simply ends later
+            room = len(pcm)
+
+        rate = 1.0
+        if len(pcm) > room:
+            if len(pcm) <= room * MAX_FIT_RATE:
+                rate = len(pcm) / room
+                pcm = apply_effects(pcm, frame_rate, [('tempo', {'rate': rate})])[:room]
+            else:
+                overflow_ms = (len(pcm) - room) * 1000 // frame_rate + 1
+                print(f"Line {entry['index']} is {overflow_ms} ms too long for its slot, moving the following lines")
+                shift += overflow_ms
+        placements.append((entry, start_ms, pcm, rate))
+    return placements
+
+def _assemble(manifest, segments):
+    """
+    Builds the timeline in a single PCM buffer at the final sample rate and
+    returns it with the placements from _fit_segments.
+    """
+    # Draft segments use a lower sample rate, bring everything to the final rate first
+    frame_rate = manifest['frame_rate']
+    channels = max((segment.channels for segment in segments if segment is not None), default=1)
+    pcms = [_to_pcm(segment, frame_rate, channels) if segment is not None else None for segment in segments]
+    placements = _fit_segments(manifest, pcms)
+
+    length = max((start_ms * frame_rate // 1000 + len(pcm) for _, start_ms, pcm, _ in placements), default=0)
+    timeline = np.zeros((length, channels), dtype=np.int16)
+    for _, start_ms, pcm, _ in placements:
+        offset = start_ms * frame_rate // 1000
+        timeline[offset:offset + len(pcm)] = pcm
+    return pcm_to_segment(timeline, frame_rate), placements
+
+def _write_manifest(manifest, output_dir):
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+
+def render_draft(client, parsed_screenplay, voice_ids, output_dir):
+    """
+    Renders every line with the draft tier and writes draft.mp3 plus a render
+    manifest. Set "approved": true on manifest items to have them upgraded.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    segments = render_segments(client, parsed_screenplay, voice_ids, tier='draft')
+
+    manifest = {'gap_ms': GAP_MS, 'frame_rate': 44100, 'items': []}
+    for index, (item, segment) in enumerate(zip(parsed_screenplay, segments)):
+        tier = 'final' if _is_sound_effect(item) else 'draft'
+        manifest['items'].append({
+            'index': index,
+            'item': item,
+            'approved': False,
+            'tier': tier,
+            'segment': _save_segment(output_dir, index, tier, segment) if segment is not None else None,
+        })
+
+    _layout_slots(manifest, segments)
+    output_filename = os.path.join(output_dir, "draft.mp3")
+    timeline, _ = _assemble(manifest, segments)
+    timeline.export(output_filename, format="mp3")
+    _write_manifest(manifest, output_dir)
+    print(f"\nSaved draft to: {output_filename}")
+    return manifest
+
+def upgrade_approved(client, voice_ids, output_dir):
+    """
+    Re-renders only the approved draft lines with the final tier and rebuilds
+    the timeline from the stored segments, leaving every other line untouched.
+    Upgraded lines keep their draft start; see _fit_segments for takes that
+    are longer than their slot. The resulting offsets are stored as
+    final_start_ms and final_duration_ms, next to the draft ones.
+    """
+    with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    pending = [entry for entry in manifest['items'] if entry['approved'] and entry['tier'] == 'draft']
+    print(f"Upgrading {len(pending)} approved lines to the final tier...")
+    upgraded = render_segments(client, [entry['item'] for entry in pending], voice_ids, tier='final')
+
+    for entry, segment in zip(pending, upgraded):
+        if segment is None:
+            print(f"Keeping draft for line {entry['index']}, final render failed")
+            continue
+        entry['tier'] = 'final'
+        entry['segment'] = _save_segment(output_dir, entry['index'], 'final', segment)
+
+    output_filename = os.path.join(output_dir, "final.mp3")
+    timeline, placements = _assemble(manifest, _load_segments(manifest, output_dir))
+    for entry, start_ms, pcm, rate in placements:
+        entry['final_start_ms'] = start_ms
+        entry['final_duration_ms'] = len(pcm) * 1000 // manifest['frame_rate']
+        entry['fit_rate'] = rate
+    timeline.export(output_filename, format="mp3")
+    _write_manifest(manifest, output_dir)
+    print(f"\nSaved final render to: {output_filename}")
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Two-tier draft/final rendering")
+    parser.add_argument('stage', choices=['draft', 'upgrade'])
+    parser.add_argument('--script', default='Skript.docx')
+    parser.add_argument('--output-dir', default='render')
+    args = parser.parse_args()
+
+    client = create_client()
+    if args.stage == 'draft':
+        parsed_screenplay = parse_screenplay(run_parser(args.script))
+        render_draft(client, parsed_screenplay, VOICE_IDS, args.output_dir)
+    else:
+        upgrade_approved(client, VOICE_IDS, args.output_dir)
+
+if __name__ == "__main__":
+    main()